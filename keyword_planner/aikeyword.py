@@ -1,9 +1,11 @@
 import os
+import httpx
 from dotenv import load_dotenv
 from langchain.chat_models import init_chat_model
 from langchain_core.messages import HumanMessage, SystemMessage
-import json
-from typing import Any, Dict, TypedDict, List, Optional
+from sentence_transformers import SentenceTransformer
+import orjson
+from typing import Any, Callable, Dict, TypedDict, List, Optional, Tuple, cast
 from scrapper import AppDetails
 
 load_dotenv()
@@ -22,44 +24,100 @@ else:
     raise ValueError("GROQ_API_KEY environment variable not set.")
 
 
-# model = init_chat_model("groq:llama3-8b-8192")
-# humanMessageData = ""
-# messages = [
-#     SystemMessage(""" You are a helpful assistant. And brilliant SEO engineer. 
-#     Which analyze the given IOS APP category, description and competitor apps 
-#     and in response return top 30 keywords for apps and 10 top keywords for its 
-#     competitors, and the data in given json format aikeywords:[appKeywords:["keyword1","keyword2"...etc], "compKeywords":{"comp_app1": ["keyword1", "keyword2"...etc], "comp_app2": ["keyword1", "keyword2"...etc}] """),
-#     SystemMessage(""" You are a helpful assistant. And brilliant SEO engineer. Which analyze the given IOS APP category, description and competitor apps and in response return top 30 keywords for apps and 10 top keywords for its competitors, and the data in given json format aikeywords:[appKeywords:["keyword1","keyword2"...etc], "compKeywords":{"comp_app1": ["keyword1", "keyword2"...etc], "comp_app2": ["keyword1", "keyword2"...etc}] """),
-#     HumanMessage(humanMessageData)
-# ]
+# Set COMPRESS_DESCRIPTION=0 to send full descriptions to the model, e.g. when debugging prompts
+compress_description: bool = os.getenv("COMPRESS_DESCRIPTION", "1") == "1"
+
+def _compress_description(description: str) -> str:
+    """
+    Trims long App Store descriptions to their head and tail, which carry most of the
+    keyword signal, to cut prompt tokens and prefill latency.
+    """
+    if not compress_description or len(description) <= 1200:
+        return description
+    return description[:800] + " ... " + description[-200:]
+
+def _find_json_object(text: str) -> Optional[Tuple[int, int]]:
+    """
+    Locates the first balanced top-level JSON object in a single pass.
+
+    Braces inside string literals (including escaped quotes) are ignored, so a
+    stray '{' or '}' in a keyword does not break the match.
+    """
+    start = -1
+    depth = 0
+    in_string = False
+    escaped = False
+    for index, char in enumerate(text):
+        if in_string:
+            if escaped:
+                escaped = False
+            elif char == '\\':
+                escaped = True
+            elif char == '"':
+                in_string = False
+        elif char == '"':
+            if start != -1:
+                in_string = True
+        elif char == '{':
+            if start == -1:
+                start = index
+            depth += 1
+        elif char == '}' and start != -1:
+            depth -= 1
+            if depth == 0:
+                return start, index
+    return None
+
+def _parse_llm_json(text: str) -> Optional[Dict[str, Any]]:
+    """
+    Parses a JSON object out of an LLM response.
+
+    Tries the whole text with orjson first; if the model wrapped the JSON in markdown
+    or prose, falls back to the first balanced '{...}' object in the text.
+    """
+    try:
+        data = orjson.loads(text)
+        if isinstance(data, dict):
+            return data
+    except orjson.JSONDecodeError:
+        pass
+
+    bounds = _find_json_object(text)
+    if bounds is None:
+        return None
+    start, end = bounds
+    try:
+        data = orjson.loads(text[start:end + 1])
+    except orjson.JSONDecodeError as e:
+        print(f"Failed to decode JSON from AI response: {e}")
+        return None
+    return data if isinstance(data, dict) else None
 
 class AIKeywordGenerator:
+    # Shared across instances so the model client and embedder are only built once per process
+    _model: Optional[Any] = None
+    _embedder: Optional[SentenceTransformer] = None
+
     def __init__(self) ->  None:
-        self.model = init_chat_model("groq:groq/compound")
-
-    def generateKeywords(self, app_details: AppDetails) -> Optional[AIResponse]:
-        system_message = """You are a helpful assistant and a brilliant SEO engineer. 
-        Analyze the given iOS app category, description, and competitor apps. 
-        In response, return top 30 keywords for the app and 10 top keywords for each of 
-        its competitors. The data should be in the following JSON format:
-        {
-            "aikeywords": {
-                "appKeywords": ["keyword1", "keyword2", ...],
-                "compKeywords": {
-                    "comp_app1_name": ["keyword1", "keyword2", ...],
-                    "comp_app2_name": ["keyword1", "keyword2", ...]
-                }
-            }
-        }
-        Ensure all keywords are relevant and optimized for App Store Optimization (ASO).
-        And do not add generic keyword by any mean 
-        Only return the JSON object, with no other text.
-        """
+        if AIKeywordGenerator._model is None:
+            # No response_format=json_object: JSON mode has not been verified with streaming on
+            # groq/compound, so the streamed text is parsed leniently by _parse_llm_json instead
+            AIKeywordGenerator._model = init_chat_model(
+                "groq:groq/compound",
+                # Keep-alive HTTP/2 client so repeated calls reuse the TLS connection to Groq
+                http_client=httpx.Client(http2=True, limits=httpx.Limits(max_keepalive_connections=10))
+            )
+            # 384-dim sentence embeddings used as the key of the semantic keyword cache
+            AIKeywordGenerator._embedder = SentenceTransformer("sentence-transformers/all-MiniLM-L6-v2")
+        self.model = AIKeywordGenerator._model
+        self.embedder = cast(SentenceTransformer, AIKeywordGenerator._embedder)
 
+    def _buildHumanMessage(self, app_details: AppDetails) -> str:
+        """Builds the user prompt describing the app and its competitors."""
         app_name = app_details.get("appname", "N/A")
         app_subtitle = app_details.get("appsubtitle", "N/A")
         category = app_details.get("category", "N/A")
-        description = app_details.get("description", "N/A")
+        description = _compress_description(app_details.get("description", "N/A"))
         existing_keywords = app_details.get("keywords", [])
         competitor_apps_keywords = app_details.get("competitor_apps_keywords", [])
 
@@ -67,43 +125,87 @@ class AIKeywordGenerator:
         for comp in competitor_apps_keywords:
             competitor_info[comp.get("appname", "Unknown App")] = comp.get("keywords", [])
 
-        human_message_content = f"""
+        if competitor_info:
+            competitor_section = f"Competitor Apps and their Keywords: {competitor_info}"
+        else:
+            # Competitor keywords are not in the prompt (fast mode, or still being scraped); ground on names only
+            competitor_names = [comp.get("appname", "Unknown App") for comp in app_details.get("competitor_apps", [])]
+            competitor_section = (
+                f"Competitor Apps: {', '.join(competitor_names)}\n"
+                "        For each competitor listed, infer 10 likely ASO keywords based on the app name and your knowledge."
+            )
+
+        return f"""
         App Name: {app_name}
         App Subtitle: {app_subtitle}
         Category: {category}
         Description: {description}
         Existing Keywords: {', '.join(existing_keywords)}
-        Competitor Apps and their Keywords: {competitor_info}
+        {competitor_section}
+        """
+
+    def embedAppDetails(self, app_details: AppDetails) -> List[float]:
         """
+        Embeds the prompt for the given app so near-identical apps can be served from the semantic cache.
+        Embeddings are normalized, so Typesense's cosine distance equals 1 - similarity.
+        """
+        embedding = self.embedder.encode(self._buildHumanMessage(app_details), normalize_embeddings=True)
+        return embedding.tolist()
+
+    def generateKeywords(self, app_details: AppDetails, on_token: Optional[Callable[[str], None]] = None) -> Optional[AIResponse]:
+        """
+        Streams the keyword response from the model and parses it once complete.
+
+        Args:
+            app_details (AppDetails): The scraped app details used to build the prompt.
+            on_token (Optional[Callable[[str], None]]): Called with the accumulated response
+                text after every streamed chunk, so the UI can render partial output.
+        """
+        system_message = (
+            'You are an ASO expert. Return JSON matching this schema exactly: '
+            '{"aikeywords":{"appKeywords":[str*30],"compKeywords":{str:[str*10]}}}. '
+            'No generic keywords. JSON only.'
+        )
+
+        human_message_content = self._buildHumanMessage(app_details)
 
         messages = [
             SystemMessage(system_message),
             HumanMessage(human_message_content)
         ]
 
-        response = self.model.invoke(messages)
+        # Stream the response so the first tokens reach the UI without waiting for the full JSON
+        response_text = ""
         try:
-            # The response content is a string, we need to parse it as JSON
-            if isinstance(response.content, str):
-                # **FIX**: Clean the response to handle cases where the LLM includes markdown or other text.
-                response_text = response.content
-                # Find the start and end of the JSON object
-                start_index = response_text.find('{')
-                end_index = response_text.rfind('}')
-                if start_index != -1 and end_index != -1 and end_index > start_index:
-                    json_str = response_text[start_index:end_index+1]
-                    data = json.loads(json_str)
-                else:
-                    print(f"Could not find a valid JSON object in the AI response: {response_text}")
-                    return None
-
-                # Basic validation to ensure it matches our expected structure
-                if "aikeywords" in data and "appKeywords" in data["aikeywords"]:
-                    return data
-                else:
-                    print(f"AI response is missing expected structure: {data}")
-                    return None
-            return None # Should not happen, but as a fallback
-        except (json.JSONDecodeError, TypeError) as e:
+            for chunk in self.model.stream(messages):
+                if isinstance(chunk.content, str):
+                    response_text += chunk.content
+                    if on_token:
+                        on_token(response_text)
+        except Exception as e:
+            # e.g. the API rejecting the request; surface it the same way as a parse failure
+            print(f"Failed to stream AI response: {e}")
+            return None
+
+        try:
+            data = _parse_llm_json(response_text)
+            if data is None:
+                print(f"Could not find a valid JSON object in the AI response: {response_text}")
+                return None
+
+            # Basic validation to ensure it matches our expected structure
+            if "aikeywords" in data and "appKeywords" in data["aikeywords"]:
+                return data
+            else:
+                print(f"AI response is missing expected structure: {data}")
+                return None
+        except TypeError as e:
             print(f"Failed to decode or validate JSON from AI response: {e}")
-            return None
\ No newline at end of file
+            return None
+
+
+# Build the generator at import time so provider discovery and model loading happen at
+# startup rather than on the first click. Set WARM_ON_IMPORT=0 to skip.
+_WARM_GENERATOR: Optional[AIKeywordGenerator] = (
+    AIKeywordGenerator() if os.environ.get("WARM_ON_IMPORT", "1") == "1" else None
+)
@@ -1,8 +1,16 @@
 import streamlit as st
-from scrapper import AppStoreScraper
-from aikeyword import AIKeywordGenerator
+import settings
+from scrapper import AppDetails, AppStoreScraper
+from aikeyword import AIKeywordGenerator, _WARM_GENERATOR
 from typing import cast
 from typesense_client import TypesenseClient
+from concurrent.futures import ThreadPoolExecutor
+
+
+@st.cache_resource
+def get_db_client() -> TypesenseClient:
+    """Builds the Typesense client once per process so its connection pool is reused across reruns."""
+    return TypesenseClient()
 
 
 st.set_page_config(page_title="Keyword Planner", page_icon="🛰️", layout="wide")
@@ -25,7 +33,7 @@ app_url = st.text_input("App URL", placeholder="Enter Your App URL")
 
 if st.button("Generating AI Keywords"):
     if app_url:
-        dbObj = TypesenseClient()
+        dbObj = get_db_client()
         with st.spinner("Checking for existing data..."):
             existing_details, existing_keywords = dbObj.get_existing_app_data(app_url, str(country_code))
 
@@ -40,46 +48,76 @@ if st.button("Generating AI Keywords"):
             app_details = None  # Initialize app_details to None
             with st.spinner("Analyzing... wait for a moment!"):
                 scraper = AppStoreScraper(app_url, str(country_code))
-                app_details = scraper.scrape()
+                app_details = scraper.scrape_primary()
 
             if app_details:
-                ai_generator = AIKeywordGenerator()
-                with st.spinner("Generating keywords with AI..."):
-                    ai_response = ai_generator.generateKeywords(app_details=app_details)
-                
-                if ai_response:
-                    st.subheader("AI Generated Keywords:")
-                    st.json(ai_response)
-
-                    # Prepare the document for ingestion, adhering to SRP
-                    doc_to_ingest = dict(app_details)
-                    if 'competitor_apps' in doc_to_ingest and isinstance(doc_to_ingest['competitor_apps'], list):
-                        doc_to_ingest['competitor_apps'] = [
-                            f"{comp['appname']} ({comp['appurl']})" for comp in cast(list, doc_to_ingest['competitor_apps'])
-                        ]
+                # Competitor pages are scraped in the background while the LLM works on the primary app;
+                # the prompt only uses competitor names, so their keywords are kept for ingestion only.
+                # In fast mode they are skipped and the LLM infers competitor keywords from their names.
+                executor = ThreadPoolExecutor(max_workers=1)
+                competitors_future = None if settings.fast_mode else executor.submit(scraper.scrape_competitors, app_details)
+
+                try:
+                    # The model client and embedder are class-level singletons, so this is cheap after the first build
+                    ai_generator = _WARM_GENERATOR or AIKeywordGenerator()
+                    with st.spinner("Checking for similar apps..."):
+                        embedding = ai_generator.embedAppDetails(app_details)
+                        ai_response = dbObj.find_similar_ai_keywords(embedding)
+                    from_cache = ai_response is not None
+
+                    if not ai_response:
+                        stream_placeholder = st.empty()
+                        with st.spinner("Generating keywords with AI..."):
+                            # Render the partial response as it streams in instead of blocking on the full JSON
+                            ai_response = ai_generator.generateKeywords(
+                                app_details=app_details,
+                                on_token=lambda text: stream_placeholder.code(text, language="json")
+                            )
+                        stream_placeholder.empty()
+
+                    if ai_response:
+                        st.subheader("AI Generated Keywords:")
+                        st.json(ai_response)
+
+                        if competitors_future:
+                            # Competitor keywords are only stored alongside the result, never re-prompted,
+                            # so use them if the background scrape has already finished and don't wait otherwise
+                            if competitors_future.done() and not competitors_future.exception():
+                                app_details["competitor_apps_keywords"] = competitors_future.result()
+                            else:
+                                competitors_future.cancel()
+
+                        # Prepare the document for ingestion, adhering to SRP
+                        doc_to_ingest = dict(app_details)
+                        if 'competitor_apps' in doc_to_ingest and isinstance(doc_to_ingest['competitor_apps'], list):
+                            doc_to_ingest['competitor_apps'] = [
+                                f"{comp['appname']} ({comp['appurl']})" for comp in cast(list, doc_to_ingest['competitor_apps'])
+                            ]
                     
-                    # Remove keys that are not part of the appDetails schema
-                    doc_to_ingest.pop('keywords', None)
-                    doc_to_ingest.pop('competitor_apps_keywords', None)
-
-                    # Ingest data into Typesense only on success
-                    success, app_details_uid_or_error = dbObj.ingestAppDetails(doc_to_ingest, country=str(country_code))
-                    if success:
-                        # Extract appid from the original details for ingestAIKeywords
-                        app_id = app_details.get("appid", "unknown_id")
-                        if app_id == "unknown_id": # Ensure app_id was found/created
+                        # Remove keys that are not part of the appDetails schema
+                        doc_to_ingest.pop('keywords', None)
+                        doc_to_ingest.pop('competitor_apps_keywords', None)
+
+                        # The keywords document takes its appid from the original details
+                        if app_details.get("appid", "unknown_id") == "unknown_id": # Ensure app_id was found/created
                             st.error("Could not determine appid, cannot ingest keywords.")
 
-                        # Pass the returned uid from appDetails ingestion as the app_uid for the keywords document
-                        dbObj.ingestAIKeywords(ai_response, 
-                                               original_app_details=app_details,
-                                               app_details_uid=app_details_uid_or_error,
-                                               app_id=app_id, country=str(country_code))
-                        st.success("Successfully scraped, generated, and ingested new data!")
+                        # Ingest data into Typesense only on success; keywords are written after the app details
+                        success, app_details_uid_or_error = dbObj.ingest_pair(
+                            cast(AppDetails, doc_to_ingest), ai_response,
+                            original_app_details=app_details,
+                            country=str(country_code),
+                            embedding=embedding
+                        )
+                        if success:
+                            st.success("Successfully scraped, generated, and ingested new data!")
+                        else:
+                            st.error(f"Failed to ingest data into database: {app_details_uid_or_error}")
                     else:
-                        st.error(f"Failed to ingest app details into database: {app_details_uid_or_error}")
-                else:
-                    st.error("Failed to generate or parse AI keywords. Please check the logs.")
+                        st.error("Failed to generate or parse AI keywords. Please check the logs.")
+                finally:
+                    # Never wait on the background scrape here; it finishes or is dropped on its own
+                    executor.shutdown(wait=False)
             else:
                 st.error("Failed to scrape app details. Please check the URL and try again.")
     else:
@@ -1,9 +1,27 @@
-import requests
 from bs4 import BeautifulSoup, Tag
-from typing import Any, Optional, List, TypedDict
+from typing import Any, Dict, Optional, List, TypedDict
 import re
-import asyncio
-import aiohttp
+import httpx
+from concurrent.futures import ThreadPoolExecutor
+import settings
+
+# Compiled once at import; used on every scrape and every database existence check
+_COUNTRY_RE = re.compile(r"/[a-z]{2}/")
+_APPID_RE = re.compile(r'id(\d+)')
+
+_HEADERS = {
+    "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/58.0.3029.110 Safari/537.36",
+    # httpx decompresses Brotli transparently when the brotli package is installed
+    "Accept-Encoding": "br, gzip"
+}
+
+# Shared HTTP/2 client for app pages; thread-safe, and keeps the connection to apps.apple.com alive across scrapes
+_HTTP = httpx.Client(http2=True, headers=_HEADERS, timeout=10, follow_redirects=True)
+
+# Byte window parsed around the "You Might Also Like" header instead of the whole page
+_COMPETITORS_MARKER = b'You Might Also Like'
+_COMPETITORS_WINDOW_BEFORE = 4096
+_COMPETITORS_WINDOW_AFTER = 32768
 
 class CompetitorApp(TypedDict):
     """Details of a competitor app."""
@@ -31,6 +49,15 @@ class AppDetails(TypedDict):
     competitor_apps_keywords: List[CompetitorAppKeywords]
 
 
+def prepare_app_url(app_url: str, country_code: str) -> str:
+    """Returns the app URL pointing at the given country's store."""
+    # Replace /us/ or /gb/ etc., or add the country code if it's missing.
+    if _COUNTRY_RE.search(app_url):
+        return _COUNTRY_RE.sub(f"/{country_code}/", app_url)
+    else:
+        return app_url.replace("apps.apple.com/", f"apps.apple.com/{country_code}/")
+
+
 class AppStoreScraper:
     """
     A class to scrape details of an iOS app from the Apple App Store.
@@ -48,10 +75,12 @@ class AppStoreScraper:
         self.country_code = country_code.lower()
         self.url_to_scrape = self._prepare_url()
 
-        self._stop_keywords = {
+        self._stop_keywords = frozenset({
             "ios apps", "app", "appstore", "app store", "iphone", "ipad",
             "ipod touch", "itouch", "itunes", "apple"
-        }
+        })
+        # Stop keywords plus the app's own name and subtitle; extended once the page is parsed
+        self._blocklist = self._stop_keywords
 
     def _get_keywords_from_soup(self, soup: BeautifulSoup) -> List[str]:
         """Extracts and filters keywords from a BeautifulSoup object."""
@@ -60,68 +89,131 @@ class AppStoreScraper:
         if isinstance(keywords_tag, Tag):
             content = keywords_tag.get('content')
             if isinstance(content, str):
-                # Split, strip whitespace, and filter out stop keywords
-                all_keywords = [k.strip().lower() for k in content.split(',')]
+                # Lowercase once, then split, strip whitespace, and filter out blocklisted keywords
+                content = content.lower()
                 keywords = [
-                    k for k in all_keywords if k not in self._stop_keywords
-                    and k not in (self.app_name.lower(), self.app_subtitle.lower())
+                    k for k in (s.strip() for s in content.split(','))
+                    if k and k not in self._blocklist
                 ]
         return keywords
 
+    def _get_competitor_apps(self, soup: BeautifulSoup) -> List[CompetitorApp]:
+        """Extracts the competitor apps listed in the "You Might Also Like" section."""
+        competitor_apps: List[CompetitorApp] = []
+        you_might_also_like_header = soup.find('h2', string=lambda text: bool(text) and 'You Might Also Like' in text)
+        if you_might_also_like_header:
+            # Find the parent section of the header
+            parent_section = you_might_also_like_header.find_parent('section')
+            if isinstance(parent_section, Tag):
+                # Find all competitor app lockups within that section
+                competitor_lockups = parent_section.find_all('a', class_='we-lockup')
+                for lockup in competitor_lockups:
+                    if isinstance(lockup, Tag):
+                        name_tag = lockup.select_one('.we-lockup__title p')
+                        competitor_name = name_tag.get_text(strip=True) if name_tag else "Not Found"
+                        competitor_url_val = lockup.get('href')
+                        if competitor_name != "Not Found" and isinstance(competitor_url_val, str):
+                            competitor_url = competitor_url_val
+                            competitor_apps.append({"appname": competitor_name, "appurl": competitor_url})
+        return competitor_apps
+
     def _prepare_url(self) -> str:
         """Prepares the URL with the correct country code."""
-        # Use regex to substitute the country code, which is more robust
-        # It will replace /us/ or /gb/ etc., or add it if it's missing.
-        if re.search(r"\/[a-z]{2}\/", self.app_url):
-            return re.sub(r"\/[a-z]{2}\/", f"/{self.country_code}/", self.app_url)
-        else:
-            return self.app_url.replace("apps.apple.com/", f"apps.apple.com/{self.country_code}/")
-
-    async def _fetch_competitor_keywords(self, session: aiohttp.ClientSession, competitor: CompetitorApp, headers: dict) -> Optional[CompetitorAppKeywords]:
-        """Asynchronously fetches and parses keywords for a single competitor."""
+        return prepare_app_url(self.app_url, self.country_code)
+
+    def _fetch_competitor_keywords(self, competitor: CompetitorApp) -> Optional[CompetitorAppKeywords]:
+        """Fetches and parses keywords for a single competitor."""
         try:
-            async with session.get(competitor["appurl"], headers=headers, timeout=aiohttp.ClientTimeout(total=10)) as response:
-                response.raise_for_status()
-                html = await response.text()
-                comp_soup = BeautifulSoup(html, 'html.parser')
-                comp_keywords = self._get_keywords_from_soup(comp_soup)
-                return {
-                    "appname": competitor["appname"],
-                    "keywords": comp_keywords
-                }
+            response = _HTTP.get(competitor["appurl"])
+            response.raise_for_status()
+            comp_soup = BeautifulSoup(response.content, 'lxml')
+            comp_keywords = self._get_keywords_from_soup(comp_soup)
+            return {
+                "appname": competitor["appname"],
+                "keywords": comp_keywords
+            }
         except Exception as e:
             print(f"Could not scrape competitor {competitor['appname']} concurrently: {e}")
             return None
 
-    async def _scrape_competitors_concurrently(self, competitors: List[CompetitorApp], headers: dict) -> List[CompetitorAppKeywords]:
+    def _scrape_competitors_concurrently(self, competitors: List[CompetitorApp]) -> List[CompetitorAppKeywords]:
         """Orchestrates the concurrent scraping of competitor apps."""
-        async with aiohttp.ClientSession() as session:
-            tasks = [self._fetch_competitor_keywords(session, comp, headers) for comp in competitors[:3]]
-            results = await asyncio.gather(*tasks)
-            return [res for res in results if res] # Filter out None results from failed scrapes
+        # Threads share _HTTP, so the competitor requests are multiplexed over the same HTTP/2
+        # connection that fetched the primary page instead of opening a new one per batch
+        with ThreadPoolExecutor(max_workers=3) as pool:
+            results = list(pool.map(self._fetch_competitor_keywords, competitors[:3]))
+        return [res for res in results if res] # Filter out None results from failed scrapes
 
     def scrape(self) -> Optional[AppDetails]:
         """
         Scrapes the app store page and extracts details.
 
+        Returns:
+            Optional[AppDetails]: A dictionary containing app details if successful,
+                                      otherwise None.
+        """
+        app_details = self.scrape_primary()
+        if app_details and not settings.fast_mode:
+            # Concurrently scrape competitor keywords for better performance
+            app_details["competitor_apps_keywords"] = self.scrape_competitors(app_details)
+        return app_details
+
+    def scrape_competitors(self, primary: AppDetails) -> List[CompetitorAppKeywords]:
+        """
+        Scrapes keywords for the top 3 competitor apps found by scrape_primary().
+
+        Args:
+            primary (AppDetails): The app details returned by scrape_primary().
+        """
+        return self._scrape_competitors_concurrently(primary.get("competitor_apps", []))
+
+    def scrape_primary(self) -> Optional[AppDetails]:
+        """
+        Scrapes only the app's own page; competitor_apps_keywords is left empty.
+        Use scrape_competitors() to fill it in, e.g. from a background thread.
+
         Returns:
             Optional[AppDetails]: A dictionary containing app details if successful,
                                       otherwise None.
         """
         try:
-            headers = {
-                "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/58.0.3029.110 Safari/537.36"
-            }
-            response = requests.get(self.url_to_scrape, headers=headers, timeout=10)
+            response = _HTTP.get(self.url_to_scrape)
             response.raise_for_status()  # Raise an exception for bad status codes
+            # Raw bytes let lxml detect the encoding itself instead of decoding twice
+            html = response.content
+
+            # The competitor section sits near the end of the page. Parse only a window around it
+            # for competitors, and only the part of the page before it for the app's own details.
+            competitors_soup: Optional[BeautifulSoup] = None
+            page_html = html
+            marker_index = html.find(_COMPETITORS_MARKER)
+            main_index = html.find(b'<main')
+            if main_index != -1 and marker_index > main_index:
+                window_start = max(main_index, marker_index - _COMPETITORS_WINDOW_BEFORE)
+                window_end = marker_index + _COMPETITORS_WINDOW_AFTER
+                # lxml silently closes a cut-off section, so only trust the window when it holds the
+                # whole section; otherwise the competitors are read from the full page below
+                if (html.rfind(b'<section', window_start, marker_index) != -1
+                        and html.find(b'</section>', marker_index, window_end) != -1):
+                    competitors_soup = BeautifulSoup(html[window_start:window_end], 'lxml')
+                page_html = html[:window_start]
+
+            soup = BeautifulSoup(page_html, 'lxml')
+            full_soup: Optional[BeautifulSoup] = soup if page_html is html else None
+
+            def get_full_soup() -> BeautifulSoup:
+                """Parses the whole page on demand, for sections the truncated soup may have cut off."""
+                nonlocal full_soup
+                if full_soup is None:
+                    full_soup = BeautifulSoup(html, 'lxml')
+                return full_soup
 
-            soup = BeautifulSoup(response.text, 'html.parser')
- 
             app_name_tag = soup.find('h1', class_='product-header__title')
             self.app_name = app_name_tag.get_text(strip=True).split('\n')[0] if app_name_tag else "Not Found"
 
             app_subtitle_tag = soup.find('h2', class_='product-header__subtitle')
             self.app_subtitle = app_subtitle_tag.get_text(strip=True) if app_subtitle_tag else "Not Found"
+            self._blocklist = self._stop_keywords | {self.app_name.lower(), self.app_subtitle.lower()}
 
             rating_tag = soup.find('span', class_='we-customer-ratings__averages__display')
             rating = rating_tag.get_text(strip=True) if rating_tag else "Not Found"
@@ -140,49 +232,28 @@ class AppStoreScraper:
                             highest_res_url = srcset_val.split(',')[-1].strip().split(' ')[0]
                             iphone_screenshots.append(highest_res_url)
 
-            # Find Size
-            size = "Not Found"
-            size_dt = soup.find('dt', string='Size')
-            if size_dt:
-                size_dd = size_dt.find_next_sibling('dd')
-                if size_dd:
-                    size = size_dd.get_text(strip=True)
-
-            # Find Category
-            category = "Not Found"
-            category_dt = soup.find('dt', string='Category')
-            if category_dt:
-                category_dd = category_dt.find_next_sibling('dd')
-                if category_dd:
-                    category = category_dd.get_text(strip=True)
-
-            description_tag = soup.find('div', class_='section__description')
+            # Collect the Information list (Size, Category, ...) in a single pass over its dt tags
+            info_list = soup.find('dl', class_='information-list') or get_full_soup().find('dl', class_='information-list') or get_full_soup()
+            metadata: Dict[str, str] = {}
+            for dt in info_list.find_all('dt'):
+                dd = dt.find_next_sibling('dd')
+                metadata[dt.get_text(strip=True)] = dd.get_text(strip=True) if dd else "Not Found"
+
+            size = metadata.get('Size', "Not Found")
+            category = metadata.get('Category', "Not Found")
+
+            description_tag = soup.find('div', class_='section__description') or get_full_soup().find('div', class_='section__description')
             description = description_tag.get_text(strip=True) if description_tag else "Not Found"
 
             keywords = self._get_keywords_from_soup(soup)
 
             # Find "You Might Also Like" section and extract competitor apps
-            competitor_apps: List[CompetitorApp] = []
-            you_might_also_like_header = soup.find('h2', string=re.compile(r'You Might Also Like'))
-            if you_might_also_like_header:
-                # Find the parent section of the header
-                parent_section = you_might_also_like_header.find_parent('section')
-                if isinstance(parent_section, Tag):
-                    # Find all competitor app lockups within that section
-                    competitor_lockups = parent_section.find_all('a', class_='we-lockup')
-                    for lockup in competitor_lockups:
-                        if isinstance(lockup, Tag):
-                            name_tag = lockup.select_one('.we-lockup__title p')
-                            competitor_name = name_tag.get_text(strip=True) if name_tag else "Not Found"
-                            competitor_url_val = lockup.get('href')
-                            if competitor_name != "Not Found" and isinstance(competitor_url_val, str):
-                                competitor_url = competitor_url_val
-                                competitor_apps.append({"appname": competitor_name, "appurl": competitor_url})
-
-            # Scrape keywords for the top 3 competitor apps
-            # Asynchronously scrape competitor keywords for better performance
-            competitor_apps_keywords = asyncio.run(self._scrape_competitors_concurrently(competitor_apps, headers))
-            appid_match = re.search(r'id(\d+)', self.url_to_scrape)
+            if competitors_soup is not None:
+                competitor_apps = self._get_competitor_apps(competitors_soup)
+            else:
+                competitor_apps = self._get_competitor_apps(get_full_soup())
+
+            appid_match = _APPID_RE.search(self.url_to_scrape)
             appid = appid_match.group(1) if appid_match else "unknown_id"
 
             return {
@@ -197,10 +268,10 @@ class AppStoreScraper:
                 "description": description,
                 "keywords": keywords,
                 "competitor_apps": competitor_apps,
-                "competitor_apps_keywords": competitor_apps_keywords
+                "competitor_apps_keywords": []
             }
 
-        except requests.exceptions.RequestException as e:
+        except httpx.HTTPError as e:
             print(f"Error fetching URL {self.url_to_scrape}: {e}")
             return None
         except Exception as e:
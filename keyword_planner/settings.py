@@ -0,0 +1,7 @@
+import os
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# FAST_MODE=1 skips scraping competitor pages; the LLM infers competitor keywords from their names instead
+fast_mode: bool = os.getenv("FAST_MODE", "0") == "1"
@@ -0,0 +1,115 @@
+"""Offline tests for AppStoreScraper.scrape_primary() against fixture App Store pages."""
+from typing import List
+
+import httpx
+import pytest
+
+import scrapper
+from scrapper import AppStoreScraper
+
+APP_URL = "https://apps.apple.com/us/app/example-app/id123456789"
+
+
+def _lockup(index: int, padding: int = 0) -> str:
+    # Real lockups carry large inline artwork markup; the padding stands in for it
+    filler = f'<span class="we-lockup__artwork">{"x" * padding}</span>' if padding else ""
+    return (
+        f'<a class="we-lockup" href="https://apps.apple.com/us/app/competitor-{index}/id{1000 + index}">'
+        f'{filler}<div class="we-lockup__title"><p>Competitor {index}</p></div></a>'
+    )
+
+
+def _details() -> str:
+    return (
+        '<dl class="information-list">'
+        '<dt>Size</dt><dd>42.1 MB</dd>'
+        '<dt>Category</dt><dd>Productivity</dd>'
+        '</dl>'
+        '<div class="section__description"><p>Plan your day with Example App.</p></div>'
+    )
+
+
+def _page(lockups: List[str], details_before_gap: bool = True, gap: int = 0, with_competitors: bool = True) -> bytes:
+    """Builds an app page; details either sit right after the header or just before the competitor section."""
+    header = (
+        '<h1 class="product-header__title">Example App</h1>'
+        '<h2 class="product-header__subtitle">Daily planner</h2>'
+        '<span class="we-customer-ratings__averages__display">4.7</span>'
+    )
+    competitors = (
+        '<section class="l-content-width section">'
+        '<h2 class="section__headline">You Might Also Like</h2>'
+        f'{"".join(lockups)}'
+        '</section>'
+    ) if with_competitors else ""
+    spacer = f'<div class="spacer">{"y" * gap}</div>'
+    body = header + (_details() + spacer if details_before_gap else spacer + _details()) + competitors
+    return (
+        '<html><head><meta name="keywords" content="Planner, Calendar, App, Example App">'
+        f'</head><body><main>{body}</main><footer>Copyright</footer></body></html>'
+    ).encode()
+
+
+class _FakeClient:
+    """Stands in for the shared HTTP client, always returning the given page."""
+
+    def __init__(self, content: bytes):
+        self.content = content
+
+    def get(self, url: str) -> httpx.Response:
+        return httpx.Response(200, content=self.content, request=httpx.Request("GET", url))
+
+
+@pytest.fixture
+def scrape(monkeypatch):
+    def _scrape(content: bytes):
+        monkeypatch.setattr(scrapper, "_HTTP", _FakeClient(content))
+        return AppStoreScraper(APP_URL, "us").scrape_primary()
+    return _scrape
+
+
+def test_scrape_primary_parses_a_regular_page(scrape):
+    details = scrape(_page([_lockup(i) for i in range(3)], gap=10000))
+
+    assert details is not None
+    assert details["appid"] == "123456789"
+    assert details["appname"] == "Example App"
+    assert details["appsubtitle"] == "Daily planner"
+    assert details["rating"] == "4.7"
+    assert details["size"] == "42.1 MB"
+    assert details["category"] == "Productivity"
+    assert details["description"] == "Plan your day with Example App."
+    assert details["keywords"] == ["planner", "calendar"]
+    assert [app["appname"] for app in details["competitor_apps"]] == ["Competitor 0", "Competitor 1", "Competitor 2"]
+
+
+def test_scrape_primary_finds_details_inside_the_competitor_window(scrape):
+    # Metadata and description sit within the bytes parsed for competitors, not the truncated page
+    details = scrape(_page([_lockup(i) for i in range(3)], details_before_gap=False, gap=10000))
+
+    assert details is not None
+    assert details["size"] == "42.1 MB"
+    assert details["category"] == "Productivity"
+    assert details["description"] == "Plan your day with Example App."
+    assert len(details["competitor_apps"]) == 3
+
+
+def test_scrape_primary_keeps_every_lockup_of_a_long_competitor_section(scrape):
+    lockups = [_lockup(i, padding=4000) for i in range(12)]
+    content = _page(lockups, gap=10000)
+    marker_index = content.find(scrapper._COMPETITORS_MARKER)
+    assert content.find(b"</section>", marker_index) > marker_index + scrapper._COMPETITORS_WINDOW_AFTER
+
+    details = scrape(content)
+
+    assert details is not None
+    assert [app["appname"] for app in details["competitor_apps"]] == [f"Competitor {i}" for i in range(12)]
+
+
+def test_scrape_primary_without_competitor_section(scrape):
+    details = scrape(_page([], with_competitors=False))
+
+    assert details is not None
+    assert details["appname"] == "Example App"
+    assert details["size"] == "42.1 MB"
+    assert details["competitor_apps"] == []
@@ -1,15 +1,22 @@
 import typesense
+import orjson
+import threading
+from cachetools import TTLCache, cachedmethod
+from cachetools.keys import hashkey
 from datetime import datetime
-from typing import Any, Dict, cast, Optional, Tuple, TYPE_CHECKING
+from typing import Any, Dict, List, cast, Optional, Tuple, TYPE_CHECKING
 import uuid
-import re
+import hashlib
 import os
 from dotenv import load_dotenv
-from scrapper import AppDetails
-from aikeyword import AIResponse
+from scrapper import AppDetails, prepare_app_url
 
 load_dotenv()
 
+if TYPE_CHECKING:
+    # Type-only import: importing aikeyword at runtime builds the Groq client and embedder
+    from aikeyword import AIResponse
+
 typesense_host = os.getenv("TYPESENSE_HOST")
 if not typesense_host:
     raise ValueError("TYPESENSE_HOST environment variable not set.")
@@ -18,12 +25,21 @@ typesense_api_key = os.getenv("TYPESENSE_API_KEY")
 if not typesense_api_key:
     raise ValueError("TYPESENSE_API_KEY environment variable not set.")
 
-if TYPE_CHECKING:
-    from typesense.api.documents import SearchParameters  # type: ignore
+def app_document_id(prepared_app_url: str, country: str) -> str:
+    """Deterministic document id for an app in a given country, shared by appDetails and aiKeywords."""
+    return hashlib.sha1(f"{country}|{prepared_app_url}".encode()).hexdigest()
+
+def _to_jsonl(documents: List[Dict[str, Any]]) -> bytes:
+    """Serializes documents to the JSONL body expected by the import endpoint."""
+    # orjson emits bytes directly, so there is no str -> bytes encode before sending
+    return b"\n".join(orjson.dumps(doc) for doc in documents)
 
 class TypesenseClient:
     
     def __init__(self,api_key: str = typesense_api_key, host: str = typesense_host):
+        # In-process TTL cache in front of get_existing_app_data; Streamlit sessions share this client
+        self._existing_app_cache: TTLCache = TTLCache(maxsize=512, ttl=300)
+        self._existing_app_cache_lock = threading.Lock()
 
         self.client = typesense.Client({
             'api_key': api_key,
@@ -74,6 +90,7 @@ class TypesenseClient:
                 {"name":"uid", "type": "string"},
                 {"name":"app_uid", "type":"string"},
                 {"name":"appid", "type": "string", "facet": True},
+                {"name":"appurl", "type": "string", "optional": True},
                 {"name":"country", "type": "string"},
                 {"name":"keywords", "type": "string[]"},
                 {"name": "competitor_apps", "type": "string[]"},
@@ -81,13 +98,21 @@ class TypesenseClient:
                 {"name":"ai_keywords", "type":"string[]"},
                 {"name": "ai_comp_keywords", "type": "string[]"},
                 {"name": "ingested_datetime", "type": "string"},
-                {"name": "modified_datetime", "type": "string"}
+                {"name": "modified_datetime", "type": "string"},
+                {"name": "vector", "type": "float[]", "num_dim": 384, "optional": True}
             ]
         }
 
         try:
             if collection_name in self.client.collections:
-                print(f"Schema of {collection_name} already exists.")
+                # Collections created before the optional appurl/vector fields existed need them added in place
+                existing_fields = {field["name"] for field in self.client.collections[collection_name].retrieve()["fields"]}
+                missing_fields = [field for field in schema["fields"] if field["name"] not in existing_fields]
+                if missing_fields:
+                    self.client.collections[collection_name].update({"fields": missing_fields})
+                    print(f"Schema of {collection_name} updated with fields: {[field['name'] for field in missing_fields]}")
+                else:
+                    print(f"Schema of {collection_name} already exists.")
             else:
                 self.client.collections.create(schema)
                 print(f"Schema of {schema['name']} is created successfully")
@@ -98,101 +123,204 @@ class TypesenseClient:
     def get_existing_app_data(self, app_url: str, country: str) -> Tuple[Optional[Dict[str, Any]], Optional[Dict[str, Any]]]:
         """
         Checks if app data already exists in Typesense and returns it if found.
-        Searches for app details, and if found, uses the appid to find the corresponding AI keywords.
+        Results are cached in-process for a few minutes per (prepared app URL, country),
+        so repeat submits of the same app skip the round trip to Typesense.
         """
-        app_details_collection = "appDetails"
-        ai_keywords_collection = "aiKeywords"
-
         # Prepare the URL to match how it's stored in the database
-        prepared_app_url = app_url
-        if re.search(r"\/[a-z]{2}\/", app_url):
-            prepared_app_url = re.sub(r"\/[a-z]{2}\/", f"/{country}/", app_url)
-        else:
-            prepared_app_url = app_url.replace("apps.apple.com/", f"apps.apple.com/{country}/")
+        prepared_app_url = prepare_app_url(app_url, country)
 
         try:
-            # 1. Search for the app in the appDetails collection
-            search_params: "SearchParameters" = {
-                'q': prepared_app_url,
-                'query_by': 'appurl',
-                'filter_by': f'country:={country}'
-            }
-            search_result = self.client.collections[app_details_collection].documents.search(search_params) # type: ignore
-
-            if search_result['found'] > 0 and search_result['hits'][0]['document']['appurl'] == prepared_app_url:
-                app_details_doc: Dict[str, Any] = dict(search_result['hits'][0]['document'])
-                appid = app_details_doc.get('appid')
-                print(f"Found existing app details for appid: {appid}")
-
-                if not appid:
-                    return app_details_doc, None # Found details but no appid to link.
-
-                # 2. Search for the corresponding AI keywords
-                
-                keyword_search_params = {'q': '*', 'filter_by': f'appid:={appid} && country:={country}'}
-                keyword_search_result = self.client.collections[ai_keywords_collection].documents.search(keyword_search_params) # type: ignore
-
-                if keyword_search_result['found'] > 0:
-                    return app_details_doc, dict(keyword_search_result['hits'][0]['document'])
-                return app_details_doc, None  # Return app details even if keywords are missing.
+            return self._get_existing_app_data_cached(prepared_app_url, country)
         except Exception as e:
+            # Errors propagate out of the cached lookup, so transient failures are not cached
             print(f"Error searching for existing app data: {e}")
         return None, None
 
-    def ingestAppDetails(self, app_details: AppDetails, country: str) -> tuple[bool, str]:
-        collection_name = "appDetails"
+    @cachedmethod(
+        lambda self: self._existing_app_cache,
+        key=lambda self, prepared_app_url, country: hashkey(prepared_app_url, country),
+        lock=lambda self: self._existing_app_cache_lock
+    )
+    def _get_existing_app_data_cached(self, prepared_app_url: str, country: str) -> Tuple[Optional[Dict[str, Any]], Optional[Dict[str, Any]]]:
+        """
+        Looks up the stored documents for an app. Both documents are keyed by app_document_id(),
+        so they are fetched with an exact id filter (no text scoring) in a single multi_search round trip.
+        """
+        app_details_collection = "appDetails"
+        ai_keywords_collection = "aiKeywords"
+        doc_id = app_document_id(prepared_app_url, country)
+
+        searches = {
+            'searches': [
+                {
+                    'collection': app_details_collection,
+                    'q': '*',
+                    'filter_by': f'id:={doc_id}'
+                },
+                {
+                    'collection': ai_keywords_collection,
+                    'q': '*',
+                    'filter_by': f'id:={doc_id}',
+                    'exclude_fields': 'vector'
+                }
+            ]
+        }
+        search_result, keyword_search_result = self.client.multi_search.perform(searches, {})['results'] # type: ignore
+
+        # multi_search reports per-search failures in the result instead of raising; raise here
+        # so a failed lookup is not cached as "not found"
+        for result in (search_result, keyword_search_result):
+            if 'error' in result:
+                raise typesense.exceptions.TypesenseClientError(f"multi_search failed ({result.get('code')}): {result['error']}")
+
+        if search_result.get('found', 0) > 0:
+            app_details_doc: Dict[str, Any] = dict(search_result['hits'][0]['document'])
+            print(f"Found existing app details for appid: {app_details_doc.get('appid')}")
+
+            if keyword_search_result.get('found', 0) > 0:
+                return app_details_doc, dict(keyword_search_result['hits'][0]['document'])
+            return app_details_doc, None  # Return app details even if keywords are missing.
+        return None, None
+
+    def _invalidate_existing_app_data(self, prepared_app_url: str, country: str) -> None:
+        """Drops the cached existence check for an app after it has been (re)ingested."""
+        with self._existing_app_cache_lock:
+            self._existing_app_cache.pop(hashkey(prepared_app_url, country), None)
+
+    def find_similar_ai_keywords(self, embedding: List[float], distance_threshold: float = 0.08) -> Optional["AIResponse"]:
+        """
+        Semantic cache lookup: returns the AI keywords of the nearest stored app if its
+        cosine distance to the given embedding is within the threshold (0.08 ~ 0.92 similarity).
+        """
+        vector = ",".join(str(value) for value in embedding)
+        searches = {
+            'searches': [{
+                'collection': 'aiKeywords',
+                'q': '*',
+                'vector_query': f'vector:([{vector}], k:1, distance_threshold:{distance_threshold})',
+                'exclude_fields': 'vector'
+            }]
+        }
+        try:
+            # multi_search sends the query in the POST body; a 384-dim vector is too long for a GET URL
+            result = self.client.multi_search.perform(searches, {})['results'][0] # type: ignore
+            if not result.get('hits'):
+                return None
+
+            document = result['hits'][0]['document']
+            comp_keywords: Dict[str, List[str]] = {}
+            for entry in document.get('ai_comp_keywords', []):
+                # Entries are flattened as "<app name>: kw1, kw2" by ingestAIKeywords
+                app_name, _, keywords = entry.rpartition(': ')
+                comp_keywords[app_name] = [k for k in keywords.split(', ') if k]
+            print(f"Semantic cache hit for appid: {document.get('appid')}")
+            return {"aikeywords": {"appKeywords": document.get('ai_keywords', []), "compKeywords": comp_keywords}}
+        except Exception as e:
+            print(f"Error searching the semantic keyword cache: {e}")
+            return None
+
+    def _buildAppDetailsDoc(self, app_details: AppDetails, country: str) -> Dict[str, Any]:
+        """Builds the appDetails document, keyed by app_document_id()."""
         # Create a general dictionary from the TypedDict to allow adding new keys for ingestion.
         doc_to_ingest: Dict[str, Any] = dict(app_details)
-        appid = doc_to_ingest.get("appid", "unknown_id")
 
         ingestion_date = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        doc_to_ingest["id"] = app_document_id(doc_to_ingest.get("appurl", ""), country)
         doc_to_ingest["uid"] = str(uuid.uuid4())
         doc_to_ingest["ingested_datetime"] = ingestion_date
         doc_to_ingest["modified_datetime"] = ingestion_date
         doc_to_ingest["country"] = country
-        
+        return doc_to_ingest
+
+    def _buildAIKeywordsDoc(self, ai_response: "AIResponse", original_app_details: AppDetails, app_details_uid: str, app_id: str, country: str, embedding: Optional[List[float]] = None) -> Dict[str, Any]:
+        """Builds the aiKeywords document from scratch based on the schema."""
+        ingestion_date = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        aikeywords_data = ai_response.get("aikeywords", {"appKeywords": [], "compKeywords": {}})
+        comp_keywords_dict = aikeywords_data.get("compKeywords", {})
+
+        # Flatten the competitor keywords dictionary into a list of strings
+        ai_comp_keywords_flat = [
+            f"{app_name}: {', '.join(keywords)}" for app_name, keywords in comp_keywords_dict.items()
+        ]
+
+        document: Dict[str, Any] = {
+            "id": app_document_id(original_app_details.get("appurl", ""), country),
+            "uid": str(uuid.uuid4()),
+            "app_uid": app_details_uid,
+            "appid": app_id,
+            "appurl": original_app_details.get("appurl", ""),
+            "country": country,
+            "keywords": original_app_details.get("keywords", []),
+            "competitor_apps": [comp["appname"] for comp in original_app_details.get("competitor_apps", [])],
+            "competitor_apps_keywords": [f"{comp['appname']}: {', '.join(comp['keywords'])}" for comp in original_app_details.get("competitor_apps_keywords", [])],
+            "ai_keywords": aikeywords_data.get("appKeywords", []),
+            "ai_comp_keywords": ai_comp_keywords_flat,
+            "ingested_datetime": ingestion_date,
+            "modified_datetime": ingestion_date,
+        }
+        if embedding:
+            document["vector"] = embedding
+        return document
+
+    def ingestAppDetails(self, app_details: AppDetails, country: str) -> tuple[bool, str]:
+        collection_name = "appDetails"
         try:
-            self.client.collections[collection_name].documents.import_([doc_to_ingest], {"action": "upsert"}) # type: ignore
+            doc_to_ingest = self._buildAppDetailsDoc(app_details, country)
+            self._importDocuments(collection_name, [doc_to_ingest])
+            self._invalidate_existing_app_data(doc_to_ingest.get("appurl", ""), country)
             return True, str(doc_to_ingest.get('uid'))
         except Exception as e:
             print(f"Error ingesting app details: {e}")
             return False, f"Error: {e}"
 
 
-    def ingestAIKeywords(self, ai_response: AIResponse, original_app_details: AppDetails, app_details_uid: str, app_id: str, country: str) -> str:
+    def ingestAIKeywords(self, ai_response: "AIResponse", original_app_details: AppDetails, app_details_uid: str, app_id: str, country: str, embedding: Optional[List[float]] = None) -> str:
         collection_name = "aiKeywords"
-        ingestion_date = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
 
         try:
-            # **FIX**: Build the document from scratch based on the schema
-            aikeywords_data = ai_response.get("aikeywords", {"appKeywords": [], "compKeywords": {}})
-            comp_keywords_dict = aikeywords_data.get("compKeywords", {})
-
-            # Flatten the competitor keywords dictionary into a list of strings
-            ai_comp_keywords_flat = [
-                f"{app_name}: {', '.join(keywords)}" for app_name, keywords in comp_keywords_dict.items()
-            ]
-
-            document = {
-                "uid": str(uuid.uuid4()),
-                "app_uid": app_details_uid,
-                "appid": app_id,
-                "country": country,
-                "keywords": original_app_details.get("keywords", []),
-                "competitor_apps": [comp["appname"] for comp in original_app_details.get("competitor_apps", [])],
-                "competitor_apps_keywords": [f"{comp['appname']}: {', '.join(comp['keywords'])}" for comp in original_app_details.get("competitor_apps_keywords", [])],
-                "ai_keywords": aikeywords_data.get("appKeywords", []),
-                "ai_comp_keywords": ai_comp_keywords_flat,
-                "ingested_datetime": ingestion_date,
-                "modified_datetime": ingestion_date,
-            }
-
-            self.client.collections[collection_name].documents.import_([document], {"action": "upsert"})
+            document = self._buildAIKeywordsDoc(ai_response, original_app_details, app_details_uid, app_id, country, embedding)
+            self._importDocuments(collection_name, [document])
+            self._invalidate_existing_app_data(document["appurl"], country)
             return "Success"
         except Exception as e:
             print(f"Error ingesting AI keywords: {e}")
             return f"Error: {e}"
 
+    def _importDocuments(self, collection_name: str, documents: List[Dict[str, Any]]) -> None:
+        """Upserts documents through the JSONL import endpoint, raising if any document is rejected."""
+        # A raw JSONL body makes import_ return the raw per-document results instead of raising
+        response = self.client.collections[collection_name].documents.import_(_to_jsonl(documents), {"action": "upsert"}) # type: ignore
+        for line in str(response).splitlines():
+            result = orjson.loads(line)
+            if not result.get("success"):
+                raise ValueError(f"{collection_name} import failed: {result.get('error')}")
+
+    def ingest_pair(self, app_details: AppDetails, ai_response: "AIResponse", original_app_details: AppDetails, country: str, embedding: Optional[List[float]] = None) -> tuple[bool, str]:
+        """
+        Ingests the app details and then the AI keywords document on the shared Typesense client.
+        The keywords document is only written once the app details import succeeds, so a failed
+        write never leaves an orphan keywords document (and its vector) answering semantic cache lookups.
+
+        Returns:
+            tuple[bool, str]: (True, app details uid) on success, otherwise (False, error message).
+        """
+        try:
+            app_doc = self._buildAppDetailsDoc(app_details, country)
+            ai_doc = self._buildAIKeywordsDoc(
+                ai_response, original_app_details,
+                app_details_uid=app_doc["uid"],
+                app_id=original_app_details.get("appid", "unknown_id"),
+                country=country, embedding=embedding
+            )
+
+            self._importDocuments("appDetails", [app_doc])
+            self._importDocuments("aiKeywords", [ai_doc])
+            self._invalidate_existing_app_data(app_doc.get("appurl", ""), country)
+            return True, str(app_doc["uid"])
+        except Exception as e:
+            print(f"Error ingesting app details and AI keywords: {e}")
+            return False, f"Error: {e}"
+
         
 """
 # Collection creation purpose